@@ -3,7 +3,7 @@
 
 from __future__ import annotations
 
-import json
+import os
 import pickle
 import re
 import warnings
@@ -30,11 +30,16 @@ from conda.gateways.repodata import (
     RepoInterface,
     Response304ContentUnchanged,
     cache_fn_url,
+    json_loads,
 )
 
 from .. import CondaError
 from ..auxlib.ish import dals
-from ..base.constants import CONDA_PACKAGE_EXTENSION_V1, REPODATA_FN
+from ..base.constants import (
+    CONDA_PACKAGE_EXTENSION_V1,
+    CONDA_PACKAGE_EXTENSION_V2,
+    REPODATA_FN,
+)
 from ..base.context import context
 from ..common.compat import ensure_unicode
 from ..common.io import DummyExecutor, ThreadLimitedThreadPoolExecutor, dashlist
@@ -53,9 +58,10 @@ from ..trust.signature_verification import signature_verification
 
 log = getLogger(__name__)
 
-REPODATA_PICKLE_VERSION = 30
+REPODATA_PICKLE_VERSION = 31
 MAX_REPODATA_VERSION = 1
 REPODATA_HEADER_RE = b'"(_etag|_mod|_cache_control)":[ ]?"(.*?[^\\\\])"[,}\\s]'  # NOQA
+_REPODATA_HEADER_PATTERN = re.compile(REPODATA_HEADER_RE)
 
 
 def get_repo_interface() -> type[RepoInterface]:
@@ -155,7 +161,9 @@ class SubdirData(metaclass=SubdirDataType):
                 SubdirData(Channel(url), repodata_fn=repodata_fn).query(package_ref_or_match_spec)
             )
 
-        # TODO test timing with ProcessPoolExecutor
+        # Threads rather than processes: SubdirData instances are memoized in
+        # SubdirData._cache_ for the life of this process, and worker processes
+        # would have to pickle every matching record back to the parent.
         Executor = (
             DummyExecutor
             if context.debug or context.repodata_threads == 1
@@ -172,14 +180,15 @@ class SubdirData(metaclass=SubdirDataType):
         if isinstance(param, str):
             param = MatchSpec(param)  # type: ignore
         if isinstance(param, MatchSpec):
+            match = param.compile_predicate()
             if param.get_exact_value("name"):
                 package_name = param.get_exact_value("name")
                 for prec in self._iter_records_by_name(package_name):
-                    if param.match(prec):
+                    if match(prec):
                         yield prec
             else:
                 for prec in self.iter_records():
-                    if param.match(prec):
+                    if match(prec):
                         yield prec
         else:
             assert isinstance(param, PackageRecord)
@@ -395,13 +404,16 @@ class SubdirData(metaclass=SubdirDataType):
                     # this is handled very similar to a 304. Can the cases be merged?
                     # we may need to read_bytes() and compare a hash to the state, instead.
                     # XXX use self._repo_cache.load() or replace after passing temp path to jlap
-                    raw_repodata_str = self.cache_path_json.read_text()
+                    # read bytes: json_loads accepts them, and the length
+                    # matches st_size, unlike a decoded character count
+                    with self.cache_path_json.open("rb") as fh:
+                        raw_repodata_str = fh.read()
+                        stat = os.fstat(fh.fileno())
                     cache.state["size"] = len(raw_repodata_str)  # type: ignore
-                    stat = self.cache_path_json.stat()
                     mtime_ns = stat.st_mtime_ns
                     cache.state["mtime_ns"] = mtime_ns  # type: ignore
                     cache.refresh()
-                elif isinstance(raw_repodata_str, (str, type(None))):
+                elif isinstance(raw_repodata_str, (str, bytes, type(None))):
                     # XXX skip this if self._repo already wrote the data
                     # Can we pass this information in state or with a sentinel/special exception?
                     cache.save(raw_repodata_str or "{}")
@@ -414,6 +426,9 @@ class SubdirData(metaclass=SubdirDataType):
                 else:
                     raise
             _internal_state = self._process_raw_repodata_str(raw_repodata_str, cache.state)
+            # the parsed records no longer need the (possibly very large) raw
+            # text; don't keep it alive while pickling
+            del raw_repodata_str
             self._internal_state = _internal_state
             self._pickle_me()
             return _internal_state
@@ -424,6 +439,9 @@ class SubdirData(metaclass=SubdirDataType):
                 "Saving pickled state for %s at %s", self.url_w_repodata_fn, self.cache_path_pickle
             )
             with open(self.cache_path_pickle, "wb") as fh:
+                # small header first, so that _read_pickled() can reject a
+                # stale cache without unpickling every record
+                pickle.dump(self._pickle_header(), fh, pickle.HIGHEST_PROTOCOL)
                 pickle.dump(self._internal_state, fh, pickle.HIGHEST_PROTOCOL)
         except Exception:
             log.debug("Failed to dump pickled repodata.", exc_info=True)
@@ -455,11 +473,21 @@ class SubdirData(metaclass=SubdirDataType):
             raise CondaError(message)
         else:
             _internal_state = self._process_raw_repodata_str(raw_repodata_str, cache.state)
+            del raw_repodata_str
             # taken care of by _process_raw_repodata():
             assert self._internal_state is _internal_state
             self._pickle_me()
             return _internal_state
 
+    def _pickle_header(self):
+        """
+        Fields of _internal_state that are compared by _pickle_valid_checks().
+        """
+        return {
+            key: value
+            for key, value, _ in self._pickle_valid_checks(self._internal_state, None, None)
+        }
+
     def _pickle_valid_checks(self, pickled_state, mod, etag):
         """
         Throw away the pickle if these don't all match.
@@ -478,43 +506,38 @@ class SubdirData(metaclass=SubdirDataType):
                 self.cache_path_json, self.cache_path_state, self.repodata_fn, dict=state
             )
 
-        if not isfile(self.cache_path_pickle) or not isfile(self.cache_path_json):
+        if not isfile(self.cache_path_json):
             # Don't trust pickled data if there is no accompanying json data
             return None
 
         try:
-            if isfile(self.cache_path_pickle):
-                log.debug("found pickle file %s", self.cache_path_pickle)
             with open(self.cache_path_pickle, "rb") as fh:
+                log.debug("found pickle file %s", self.cache_path_pickle)
+                _pickled_header = pickle.load(fh)
+                checks = tuple(self._pickle_valid_checks(_pickled_header, state.mod, state.etag))
+                if not all(left == right for _, left, right in checks):
+                    log.debug(
+                        "Pickle load validation failed for %s at %s. %r",
+                        self.url_w_repodata_fn,
+                        self.cache_path_json,
+                        checks,
+                    )
+                    return None
                 _pickled_state = pickle.load(fh)
+        except FileNotFoundError:
+            return None
         except Exception:
             log.debug("Failed to load pickled repodata.", exc_info=True)
             rm_rf(self.cache_path_pickle)
             return None
 
-        def checks():
-            return self._pickle_valid_checks(_pickled_state, state.mod, state.etag)
-
-        def _check_pickled_valid():
-            for _, left, right in checks():
-                yield left == right
-
-        if not all(_check_pickled_valid()):
-            log.debug(
-                "Pickle load validation failed for %s at %s. %r",
-                self.url_w_repodata_fn,
-                self.cache_path_json,
-                tuple(checks()),
-            )
-            return None
-
         return _pickled_state
 
     def _process_raw_repodata_str(self, raw_repodata_str, state: RepodataState | None = None):
         """
         state contains information that was previously in-band in raw_repodata_str.
         """
-        json_obj = json.loads(raw_repodata_str or "{}")
+        json_obj = json_loads(raw_repodata_str or "{}")
         return self._process_raw_repodata(json_obj, state=state)
 
     def _process_raw_repodata(self, repodata, state: RepodataState | None):
@@ -529,6 +552,9 @@ class SubdirData(metaclass=SubdirDataType):
         schannel = self.channel.canonical_name
 
         self._package_records = _package_records = PackageRecordList()
+        # append to the plain list behind PackageRecordList in the loop below,
+        # avoiding UserList's Python-level append() and __len__() per package
+        records = _package_records.data
         self._names_index = _names_index = defaultdict(list)
         self._track_features_index = _track_features_index = defaultdict(list)
 
@@ -543,8 +569,10 @@ class SubdirData(metaclass=SubdirDataType):
             "_package_records": _package_records,
             "_names_index": _names_index,
             "_track_features_index": _track_features_index,
-            "_etag": state.get("_etag"),
-            "_mod": state.get("_mod"),
+            # same accessors as _read_pickled(), so a missing header compares
+            # as "" on both sides
+            "_etag": state.etag,
+            "_mod": state.mod,
             "_cache_control": state.get("_cache_control"),
             "_url": state.get("_url"),
             "_add_pip": add_pip,
@@ -575,14 +603,22 @@ class SubdirData(metaclass=SubdirDataType):
             "subdir": subdir,
         }
 
+        # The same dependency specs and licenses repeat across thousands of
+        # packages; keep one str object per distinct value (less memory, and a
+        # smaller pickle since pickle memoizes shared objects).
+        share = {}.setdefault
+
         channel_url = self.url_w_credentials
         legacy_packages = repodata.get("packages", {})
         conda_packages = {} if context.use_only_tar_bz2 else repodata.get("packages.conda", {})
 
         _tar_bz2 = CONDA_PACKAGE_EXTENSION_V1
-        use_these_legacy_keys = set(legacy_packages.keys()) - {
-            k[:-6] + _tar_bz2 for k in conda_packages.keys()
-        }
+        _conda = CONDA_PACKAGE_EXTENSION_V2
+        # skip .tar.bz2 packages that have a .conda counterpart; checking the
+        # dict directly avoids building two temporary sets of filenames
+        use_these_legacy_keys = [
+            k for k in legacy_packages if k[: -len(_tar_bz2)] + _conda not in conda_packages
+        ]
 
         for group, copy_legacy_md5 in (
             (conda_packages.items(), True),
@@ -613,13 +649,22 @@ class SubdirData(metaclass=SubdirDataType):
                     )
                     continue
 
+                depends = info.get("depends")
+                if depends:
+                    info["depends"] = list(map(share, depends, depends))
+                constrains = info.get("constrains")
+                if constrains:
+                    info["constrains"] = list(map(share, constrains, constrains))
+                license = info.get("license")
+                if license:
+                    info["license"] = share(license, license)
+
                 # lazy
                 # package_record = PackageRecord(**info)
                 info["fn"] = fn
                 info["url"] = join_url(channel_url, fn)
-                _package_records.append(info)
-                record_index = len(_package_records) - 1
-                _names_index[info["name"]].append(record_index)
+                _names_index[info["name"]].append(len(records))
+                records.append(info)
 
         self._internal_state = _internal_state
         return _internal_state
@@ -633,7 +678,7 @@ def read_mod_and_etag(path):
     with open(path, "rb") as f:
         try:
             with closing(mmap(f.fileno(), 0, access=ACCESS_READ)) as m:
-                match_objects = islice(re.finditer(REPODATA_HEADER_RE, m), 3)
+                match_objects = islice(_REPODATA_HEADER_PATTERN.finditer(m), 3)
                 result = dict(
                     map(ensure_unicode, mo.groups()) for mo in match_objects  # type: ignore
                 )
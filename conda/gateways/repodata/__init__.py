@@ -14,6 +14,7 @@ import time
 import warnings
 from collections import UserDict
 from contextlib import contextmanager
+from functools import lru_cache
 from os.path import dirname
 from pathlib import Path
 from typing import Any
@@ -21,6 +22,7 @@ from typing import Any
 from conda.auxlib.logz import stringify
 from conda.base.constants import CONDA_HOMEPAGE_URL, REPODATA_FN
 from conda.base.context import context
+from conda.common.compat import ensure_binary
 from conda.common.url import join_url, maybe_unquote
 from conda.deprecations import deprecated
 from conda.exceptions import (
@@ -44,6 +46,11 @@ from conda.models.channel import Channel
 
 from .lock import lock
 
+try:
+    from orjson import loads as json_loads
+except ImportError:  # pragma: no cover
+    from json import loads as json_loads
+
 log = logging.getLogger(__name__)
 stderrlog = logging.getLogger("conda.stderrlog")
 
@@ -350,7 +357,7 @@ class RepodataState(UserDict):
         try:
             state_path = self.cache_path_state
             log.debug("Load %s cache from %s", self.repodata_fn, state_path)
-            state = json.loads(state_path.read_text())
+            state = json_loads(state_path.read_text())
             # json and state files should match
             json_stat = self.cache_path_json.stat()
             if not (
@@ -479,6 +486,22 @@ class RepodataState(UserDict):
         return super().__getitem__(key)
 
 
+@contextmanager
+def sibling_temp_path(path: Path):
+    """
+    Yield a unique temporary path next to `path`, on the same filesystem so it
+    can be renamed over `path`. Removed on exit unless it was renamed.
+    """
+    temp_path = path.with_name(f"{path.name}.{os.urandom(4).hex()}.tmp")
+    try:
+        yield temp_path
+    finally:
+        try:
+            temp_path.unlink()
+        except OSError:
+            pass
+
+
 class RepodataCache:
     """
     Handle caching for a single repodata.json + repodata.state.json
@@ -528,14 +551,14 @@ class RepodataCache:
         with self.cache_path_state.open("r+") as state_file, lock(state_file):
             # cannot use pathlib.read_text / write_text on any locked file, as
             # it will release the lock early
-            state = json.loads(state_file.read())
+            state = json_loads(state_file.read())
 
             # json and state files should match. must read json before checking
             # stat (if json_data is to be trusted)
             if state_only:
                 json_data = ""
             else:
-                json_data = self.cache_path_json.read_text()
+                json_data = self.cache_path_json.read_text(encoding="utf-8")
 
             json_stat = self.cache_path_json.stat()
             if not (
@@ -575,24 +598,19 @@ class RepodataCache:
             self.state.clear()
         return self.state
 
-    def save(self, data: str):
+    def save(self, data: str | bytes):
         """
         Write data to <repodata>.json cache path, synchronize state.
-        """
-        temp_path = self.cache_dir / f"{self.name}.{os.urandom(4).hex()}.tmp"
 
-        try:
-            with temp_path.open("x") as temp:  # exclusive mode, error if exists
-                temp.write(data)
+        `str` data is written as UTF-8; `bytes` are written unchanged.
+        """
+        with sibling_temp_path(self.cache_path_json) as temp_path:
+            # exclusive mode, error if exists; large buffer for multi-MB repodata
+            with temp_path.open("xb", buffering=1 << 20) as temp:
+                temp.write(ensure_binary(data))
 
             return self.replace(temp_path)
 
-        finally:
-            try:
-                temp_path.unlink()
-            except OSError:
-                pass
-
     def replace(self, temp_path: Path):
         """
         Rename path onto <repodata>.json path, synchronize state.
@@ -675,6 +693,7 @@ except TypeError:  # pragma: no cover
         return hashlib.md5(data)
 
 
+@lru_cache(maxsize=1024)
 def cache_fn_url(url, repodata_fn=REPODATA_FN):
     # url must be right-padded with '/' to not invalidate any existing caches
     if not url.endswith("/"):
@@ -689,6 +708,9 @@ def cache_fn_url(url, repodata_fn=REPODATA_FN):
     return f"{md5.hexdigest()[:8]}.json"
 
 
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
 def get_cache_control_max_age(cache_control_value):
-    max_age = re.search(r"max-age=(\d+)", cache_control_value)
+    max_age = _MAX_AGE_PATTERN.search(cache_control_value)
     return int(max_age.groups()[0]) if max_age else 0
@@ -6,24 +6,39 @@ import io
 
 import json
 import logging
+import os
 import pathlib
 import pprint
 import re
+import threading
 import time
 import zstandard
 from contextlib import contextmanager
 from hashlib import blake2b
-from typing import Iterator
 
 import jsonpatch
 from requests import HTTPError
 
 from conda.base.context import context
 from conda.gateways.connection import Response, Session
-from conda.gateways.repodata import RepodataState
+from conda.gateways.repodata import RepodataState, json_loads, sibling_temp_path
 
 from .core import JLAP
 
+
+def _json_dumps(obj) -> bytes:
+    """
+    Serialize like orjson.dumps(): compact, UTF-8, non-ASCII kept as is.
+    """
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+try:
+    from orjson import dumps as json_dumps
+except ImportError:  # pragma: no cover
+    json_dumps = _json_dumps
+
+
 log = logging.getLogger(__name__)
 
 
@@ -45,10 +60,24 @@ def hash():
     return blake2b(digest_size=DIGEST_SIZE)
 
 
+_thread_local = threading.local()
+
+
+def zstd_decompressor() -> zstandard.ZstdDecompressor:
+    """
+    One reusable ZstdDecompressor per thread; instances are not thread-safe.
+    """
+    try:
+        return _thread_local.decompressor
+    except AttributeError:
+        decompressor = _thread_local.decompressor = zstandard.ZstdDecompressor()
+        return decompressor
+
+
 def get_place(url, extra=""):
     if "current_repodata" in url:
         extra = f".c{extra}"
-    return pathlib.Path("-".join(url.split("/")[-3:-1])).with_suffix(f"{extra}.json")
+    return pathlib.Path("-".join(url.rsplit("/", 3)[-3:-1])).with_suffix(f"{extra}.json")
 
 
 class Jlap304NotModified(Exception):
@@ -69,10 +98,10 @@ def process_jlap_response(response: Response, pos=0, iv=b""):
     if response.status_code == 304:
         raise Jlap304NotModified()
 
-    def lines() -> Iterator[bytes]:
-        yield from response.iter_lines(delimiter=b"\n")  # type: ignore
-
-    buffer = JLAP.from_lines(lines(), iv, pos)
+    # Read the whole (range-limited) body at once and split it in C. Cheaper
+    # than iter_lines() per line, and iter_lines(delimiter=...) yields a
+    # spurious empty line whenever a network chunk ends on the delimiter.
+    buffer = JLAP.from_lines(response.content.split(b"\n"), iv, pos)
 
     # new iv == initial iv if nothing changed
     pos, footer, _ = buffer[-2]
@@ -111,17 +140,19 @@ def request_jlap(url, pos=0, etag=None, ignore_etag=True, session: Session | Non
     response = session.get(url, stream=True, headers=headers, timeout=timeout)
     response.raise_for_status()
 
-    log.debug("request headers: %s", pprint.pformat(response.request.headers))
-    log.debug(
-        "response headers: %s",
-        pprint.pformat(
-            {
-                k: v
-                for k, v in response.headers.items()
-                if any(map(k.lower().__contains__, ("content", "last", "range", "encoding")))
-            }
-        ),
-    )
+    if log.isEnabledFor(logging.DEBUG):
+        # pformat() runs before log.debug() can discard the message
+        log.debug("request headers: %s", pprint.pformat(response.request.headers))
+        log.debug(
+            "response headers: %s",
+            pprint.pformat(
+                {
+                    k: v
+                    for k, v in response.headers.items()
+                    if any(map(k.lower().__contains__, ("content", "last", "range", "encoding")))
+                }
+            ),
+        )
     log.debug("status: %d", response.status_code)
     if "range" in headers:
         # 200 is also a possibility that we'd rather not deal with; if the
@@ -146,10 +177,17 @@ def format_hash(hash):
 
 
 def find_patches(patches, have, want):
+    """
+    Return the chain of patches from `have` to `want`, newest first.
+
+    :param patches: patches as JSON text, oldest first. Parsed newest first,
+        and only until `have` is reached.
+    """
     apply = []
     for patch in reversed(patches):
         if have == want:
             break
+        patch = json.loads(patch)
         if patch["to"] == want:
             log.info(
                 "Collect %s \N{LEFTWARDS ARROW} %s", format_hash(want), format_hash(patch["from"])
@@ -164,6 +202,55 @@ def find_patches(patches, have, want):
     return apply
 
 
+def _unescape(token: str):
+    """
+    Decode one JSON Pointer reference token.
+    """
+    if "~" in token:
+        return token.replace("~1", "/").replace("~0", "~")
+    return token
+
+
+def _object_member(doc, path: str):
+    """
+    Return (parent, key) if every container on JSON Pointer `path` is a dict,
+    else None.
+    """
+    if not path.startswith("/"):
+        return None
+    *parents, key = path[1:].split("/")
+    for token in parents:
+        if type(doc) is not dict:
+            return None
+        doc = doc.get(_unescape(token))
+    if type(doc) is not dict:
+        return None
+    return doc, _unescape(key)
+
+
+def apply_ops(data, ops):
+    """
+    Apply JSON Patch operations to data in place.
+
+    add, remove and replace of an object member, which is nearly all of a
+    repodata patch, are done directly; anything else, including operations
+    that would fail, goes through jsonpatch.
+    """
+    for op in ops:
+        kind = op["op"]
+        member = kind in ("add", "remove", "replace") and _object_member(data, op["path"])
+        if member:
+            parent, key = member
+            if kind == "remove":
+                if key in parent:
+                    del parent[key]
+                    continue
+            elif "value" in op and (kind == "add" or key in parent):
+                parent[key] = op["value"]
+                continue
+        jsonpatch.apply_patch(data, [op], in_place=True)
+
+
 def apply_patches(data, apply):
     while apply:
         patch = apply.pop()
@@ -171,11 +258,14 @@ def apply_patches(data, apply):
             f"{format_hash(patch['from'])} \N{RIGHTWARDS ARROW} {format_hash(patch['to'])}, "
             f"{len(patch['patch'])} steps"
         )
-        data = jsonpatch.JsonPatch(patch["patch"]).apply(data, in_place=True)
+        apply_ops(data, patch["patch"])
+
+
+_EXTENSION_PATTERN = re.compile(r"(\.\w+)$")
 
 
 def withext(url, ext):
-    return re.sub(r"(\.\w+)$", ext, url)
+    return _EXTENSION_PATTERN.sub(ext, url)
 
 
 @contextmanager
@@ -186,16 +276,23 @@ def timeme(message):
     log.debug("%sTook %0.02fs", message, end - begin)
 
 
-def build_headers(json_path: pathlib.Path, state: RepodataState):
+def build_headers(json_path: pathlib.Path, state: RepodataState, conditional=True):
     """
     Caching headers for a path and state.
+
+    :param conditional: if False, send no validators, e.g. to replace a local
+        file that can't be patched even if the server copy is unchanged.
     """
     headers = {}
     # simplify if we require state to be empty when json_path is missing.
-    if json_path.exists():
+    # without the file a 304 Not Modified would leave nothing to use
+    if conditional and json_path.exists():
         etag = state.get("_etag")
         if etag:
             headers["if-none-match"] = etag
+        mod = state.get("_mod")
+        if mod:
+            headers["if-modified-since"] = mod
     return headers
 
 
@@ -213,13 +310,21 @@ class HashWriter(io.RawIOBase):
 
 
 def download_and_hash(
-    hasher, url, json_path, session: Session, state: RepodataState | None, is_zst=False
+    hasher,
+    url,
+    json_path,
+    session: Session,
+    state: RepodataState | None,
+    is_zst=False,
+    conditional=True,
 ):
     """
     Download url if it doesn't exist, passing bytes through hasher.update()
+
+    :param conditional: passed to build_headers()
     """
     state = state or RepodataState()
-    headers = build_headers(json_path, state)
+    headers = build_headers(json_path, state, conditional=conditional)
     timeout = context.remote_connect_timeout_secs, context.remote_read_timeout_secs
     response = session.get(url, stream=True, timeout=timeout, headers=headers)
     log.debug("%s %s", url, response.headers)
@@ -228,23 +333,45 @@ def download_and_hash(
     # is there a status code for which we must clear the file?
     if response.status_code == 200:
         if is_zst:
-            decompressor = zstandard.ZstdDecompressor()
-            writer = decompressor.stream_writer(
-                HashWriter(json_path.open("wb"), hasher), closefd=True  # type: ignore
-            )
+            # let urllib3 undo any HTTP Content-Encoding; zstd does the rest
+            response.raw.decode_content = True
+            decompressor = zstd_decompressor()
+            buf = bytearray(1 << 20)
+            view = memoryview(buf)
+            with decompressor.stream_reader(
+                response.raw, read_across_frames=True
+            ) as reader, json_path.open("wb") as repodata:
+                while True:
+                    n = reader.readinto(buf)
+                    if not n:
+                        break
+                    block = view[:n]
+                    hasher.update(block)
+                    repodata.write(block)
+                    length += n
         else:
-            writer = HashWriter(json_path.open("wb"), hasher)
-        with writer as repodata:
-            for block in response.iter_content(chunk_size=1 << 14):
-                repodata.write(block)
+            with HashWriter(json_path.open("wb"), hasher) as repodata:
+                # large blocks: one hasher.update() and write() per MiB, not per 16 KiB
+                for block in response.iter_content(chunk_size=1 << 20):
+                    length += len(block)
+                    repodata.write(block)
     if response.request:
         log.info("Download %d bytes %r", length, response.request.headers)
     return response  # can be 304 not modified
 
 
 def request_url_jlap_state(
-    url, state: RepodataState, get_place=get_place, full_download=False, *, session: Session
+    url,
+    state: RepodataState,
+    get_place=get_place,
+    full_download=False,
+    *,
+    session: Session,
+    conditional=True,
 ):
+    """
+    :param conditional: passed to download_and_hash()
+    """
 
     jlap_state = state.get(JLAP_KEY, {})
     headers = jlap_state.get(HEADERS, {})
@@ -276,6 +403,7 @@ def request_url_jlap_state(
                         session=session,
                         state=state,
                         is_zst=True,
+                        conditional=conditional,
                     )
                 else:
                     raise JlapSkipZst()
@@ -287,7 +415,12 @@ def request_url_jlap_state(
                     state.set_has_format("zst", False)
                     state[ZSTD_UNAVAILABLE] = time.time_ns()  # alternate method
                 response = download_and_hash(
-                    hasher, withext(url, ".json"), json_path, session=session, state=state
+                    hasher,
+                    withext(url, ".json"),
+                    json_path,
+                    session=session,
+                    state=state,
+                    conditional=conditional,
                 )
 
             # will we use state['headers'] for caching against
@@ -355,7 +488,8 @@ def request_url_jlap_state(
         # buffer[-2] == footer = new_state["footer"]
         # buffer[-1] == trailing checksum
 
-        patches = list(json.loads(patch) for _, patch, _ in buffer.body)
+        # parsed lazily by find_patches()
+        patches = [patch for _, patch, _ in buffer.body]
         _, footer, _ = buffer.penultimate
         want = json.loads(footer)["latest"]
 
@@ -367,18 +501,22 @@ def request_url_jlap_state(
             )
 
             if apply:
-                with timeme("Load "), json_path.open() as repodata:
+                with timeme("Load "), json_path.open("rb") as repodata:
                     # we haven't loaded repodata yet; it could fail to parse, or
                     # have the wrong hash.
-                    repodata_json = json.load(repodata)  # check have_hash here
+                    repodata_json = json_loads(repodata.read())  # check have_hash here
                     # if this fails, then we also need to fetch again from 0
 
                 apply_patches(repodata_json, apply)
 
-                with timeme("Write changed "), json_path.open("wb") as repodata:
-
+                with timeme("Write changed "):
+                    serialized = json_dumps(repodata_json)
                     hasher = hash()
-                    HashWriter(repodata, hasher).write(json.dumps(repodata_json).encode("utf-8"))
+                    hasher.update(serialized)
+
+                    with sibling_temp_path(json_path) as temp_path:
+                        temp_path.write_bytes(serialized)
+                        os.replace(temp_path, json_path)
 
                     # actual hash of serialized json
                     state[ON_DISK_HASH] = hasher.hexdigest()
@@ -401,6 +539,12 @@ def request_url_jlap_state(
 
             assert not full_download, "Recursion error"  # pragma: no cover
 
+            # stored etag/mod may be the .jlap's; a 304 would keep the bad file
             return request_url_jlap_state(
-                url, state, get_place=get_place, full_download=True, session=session
+                url,
+                state,
+                get_place=get_place,
+                full_download=True,
+                session=session,
+                conditional=False,
             )
@@ -248,12 +248,27 @@ class MatchSpec(metaclass=MatchSpecType):
                 return False
         return True
 
+    def compile_predicate(self):
+        """
+        Return a function equivalent to `self.match` for `PackageRecord`
+        arguments, with the per-field lookups resolved once.  Use it when
+        testing one spec against many records.
+        """
+        checks = tuple(
+            (attrgetter(field_name), match_component)
+            for field_name, match_component in self._match_components.items()
+        )
+
+        def predicate(rec):
+            for get_value, match_component in checks:
+                if not _match_value(match_component, get_value(rec)):
+                    return False
+            return True
+
+        return predicate
+
     def _match_individual(self, record, field_name, match_component):
-        val = getattr(record, field_name)
-        try:
-            return match_component.match(val)
-        except AttributeError:
-            return match_component == val
+        return _match_value(match_component, getattr(record, field_name))
 
     def _is_simple(self):
         return len(self._match_components) == 1 and self.get_exact_value('name') is not None
@@ -511,6 +526,13 @@ class MatchSpec(metaclass=MatchSpecType):
         return self.__class__(optional=self.optional, target=self.target, **final_components)
 
 
+def _match_value(match_component, val):
+    try:
+        return match_component.match(val)
+    except AttributeError:
+        return match_component == val
+
+
 def _parse_version_plus_build(v_plus_b):
     """This should reliably pull the build string out of a version + build string combo.
     Examples:
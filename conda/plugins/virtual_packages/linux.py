@@ -7,6 +7,8 @@ from ...base.context import context
 from ...common._os.linux import linux_get_libc_version
 from .. import CondaVirtualPackage, hookimpl
 
+_KERNEL_VERSION_PATTERN = re.compile(r"\d+\.\d+(\.\d+)?(\.\d+)?")
+
 
 @hookimpl
 def conda_virtual_packages():
@@ -23,7 +25,7 @@ def conda_virtual_packages():
     # development (`-rcN`) kernels, but that can be a TODO for later.
     _, dist_version = context.platform_system_release
     dist_version = os.environ.get("CONDA_OVERRIDE_LINUX", dist_version)
-    m = re.match(r"\d+\.\d+(\.\d+)?(\.\d+)?", dist_version)
+    m = _KERNEL_VERSION_PATTERN.match(dist_version)
     yield CondaVirtualPackage("linux", m.group() if m else "0", None)
 
     libc_family, libc_version = linux_get_libc_version()
@@ -1,8 +1,9 @@
 # Copyright (C) 2012 Anaconda, Inc
 # SPDX-License-Identifier: BSD-3-Clause
 
+import pickle
 from logging import getLogger
-from os.path import join
+from os.path import isfile, join
 from time import sleep
 from unittest import TestCase
 from unittest.mock import patch
@@ -404,3 +405,72 @@ def test_subdir_data_dict_state(platform=OVERRIDE_PLATFORM):
     local_channel = Channel(join(CHANNEL_DIR, platform))
     sd = SubdirData(channel=local_channel)
     sd._read_pickled({})  # type: ignore
+
+
+def test_pickle_reused_without_etag(tmp_path, platform=OVERRIDE_PLATFORM):
+    """
+    A file:// channel sends no etag; its pickled state must still validate.
+    """
+    local_channel = Channel(url_path(join(CHANNEL_DIR, platform)))
+
+    with env_vars(
+        {"CONDA_PLATFORM": platform, "CONDA_PKGS_DIRS": str(tmp_path)},
+        stack_callback=conda_tests_ctxt_mgmt_def_pol,
+    ):
+        SubdirData.clear_cached_local_channel_data(exclude_file=False)
+        sd = SubdirData(channel=local_channel)
+        sd.load()
+
+        state = sd.repo_cache.load_state()
+        assert not state.etag
+        pickled = sd._read_pickled(state)
+        assert pickled is not None
+        assert len(pickled["_package_records"]) == len(sd._package_records)
+
+    SubdirData.clear_cached_local_channel_data(exclude_file=False)
+
+
+def _unpickled_body():
+    raise AssertionError("pickle body must not be loaded")
+
+
+class _PickleBody:
+    def __reduce__(self):
+        return _unpickled_body, ()
+
+
+def test_pickle_header(tmp_path, platform=OVERRIDE_PLATFORM):
+    """
+    The pickle starts with the fields _pickle_valid_checks() compares; a stale
+    single-object pickle or a mismatched header is rejected before the body.
+    """
+    local_channel = Channel(url_path(join(CHANNEL_DIR, platform)))
+
+    with env_vars(
+        {"CONDA_PLATFORM": platform, "CONDA_PKGS_DIRS": str(tmp_path)},
+        stack_callback=conda_tests_ctxt_mgmt_def_pol,
+    ):
+        SubdirData.clear_cached_local_channel_data(exclude_file=False)
+        sd = SubdirData(channel=local_channel)
+        sd.load()
+        state = sd.repo_cache.load_state()
+
+        header = sd._pickle_header()
+        assert list(header) == [key for key, _, _ in sd._pickle_valid_checks({}, None, None)]
+        with open(sd.cache_path_pickle, "rb") as fh:
+            assert pickle.load(fh) == header
+
+        # pre-header format: one object holding the whole state
+        old_state = dict(sd._internal_state, _pickle_version=30)
+        with open(sd.cache_path_pickle, "wb") as fh:
+            pickle.dump(old_state, fh)
+        assert sd._read_pickled(state) is None
+
+        with open(sd.cache_path_pickle, "wb") as fh:
+            pickle.dump(dict(header, _url="https://example.com/other"), fh)
+            pickle.dump(_PickleBody(), fh)
+        assert sd._read_pickled(state) is None
+        # a body that failed to load would have removed the file
+        assert isfile(sd.cache_path_pickle)
+
+    SubdirData.clear_cached_local_channel_data(exclude_file=False)
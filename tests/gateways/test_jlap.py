@@ -136,6 +136,14 @@ def test_download_and_hash(
     # hashes the decompressed data
     assert hasher2.digest() == hasher3.digest()
 
+    # the per-thread decompressor is reused for the next download
+    assert fetch.zstd_decompressor() is fetch.zstd_decompressor()
+    hasher4 = fetch.hash()
+    fetch.download_and_hash(
+        hasher4, url3, tmp_path / "repodata.json.again", session, RepodataState(), is_zst=True
+    )
+    assert hasher4.digest() == hasher3.digest()
+
 
 @pytest.mark.parametrize("use_jlap", [True, False])
 def test_repodata_state(
@@ -559,3 +567,188 @@ def test_hashwriter():
     with writer:
         pass
     assert closed
+
+
+def test_process_jlap_response(tmp_path: Path):
+    """
+    process_jlap_response() splits the body on b"\n" into the same buffer as
+    JLAP.from_path().
+    """
+    jlap = make_test_jlap(b'{"info": {}}', changes=3).terminate()
+    jlap_path = tmp_path / "repodata.jlap"
+    jlap.write(jlap_path)
+
+    response = requests.Response()
+    response.status_code = 200
+    response._content = jlap_path.read_bytes()
+
+    buffer, state = fetch.process_jlap_response(response)
+    assert buffer == core.JLAP.from_path(jlap_path)
+    assert state["footer"] == json.loads(jlap.penultimate[1])
+    assert state["iv"] == jlap[-3][-1]
+
+    response.status_code = 304
+    with pytest.raises(fetch.Jlap304NotModified):
+        fetch.process_jlap_response(response)
+
+
+def test_find_patches():
+    """
+    find_patches() only parses patches newer than `have`.
+    """
+    jlap = make_test_jlap(b'{"info": {}}', changes=4).terminate()
+    patches = [patch for _, patch, _ in jlap.body]
+    rows = [json.loads(patch) for patch in patches]
+    want = json.loads(jlap.penultimate[1])["latest"]
+
+    # the oldest patch would fail to parse if it were inspected
+    patches[0] = "not json"
+    apply = fetch.find_patches(patches, rows[2]["from"], want)
+    assert apply == rows[:1:-1]
+
+    assert fetch.find_patches(patches, want, want) == []
+
+    with pytest.raises(fetch.JlapPatchNotFound):
+        fetch.find_patches(patches[1:], rows[0]["from"], want)
+
+
+def test_apply_ops():
+    """
+    apply_ops() agrees with jsonpatch, including operations it hands off to
+    jsonpatch.
+    """
+    doc = {
+        "info": {"subdir": "noarch"},
+        "packages": {"a-1-0.tar.bz2": {"depends": ["b"]}, "x/y~z": 1},
+        "removed": [],
+    }
+    ops = [
+        {"op": "add", "path": "/packages/c-1-0.tar.bz2", "value": {"depends": []}},
+        {"op": "replace", "path": "/packages/a-1-0.tar.bz2/depends", "value": ["b", "c"]},
+        {"op": "remove", "path": "/packages/x~1y~0z"},
+        {"op": "add", "path": "/removed/-", "value": "d-1-0.tar.bz2"},
+        {"op": "replace", "path": "/removed/0", "value": "e-1-0.tar.bz2"},
+        {"op": "copy", "from": "/info", "path": "/info2"},
+        {"op": "move", "from": "/info2", "path": "/info3"},
+    ]
+    expected = jsonpatch.apply_patch(doc, ops)
+    fetch.apply_ops(doc, ops)
+    assert doc == expected
+
+    for op in (
+        {"op": "remove", "path": "/packages/missing"},
+        {"op": "replace", "path": "/packages/missing", "value": 1},
+        {"op": "add", "path": "/missing/child", "value": 1},
+    ):
+        with pytest.raises((jsonpatch.JsonPatchException, jsonpatch.JsonPointerException)):
+            fetch.apply_ops(doc, [op])
+
+
+def test_build_headers(tmp_path: Path):
+    """
+    Conditional request headers are only sent when the cached file exists.
+    """
+    json_path = tmp_path / "repodata.json"
+    state = RepodataState(dict={"_etag": '"abc"', "_mod": "Mon, 06 Mar 2023 00:00:00 GMT"})
+    assert fetch.build_headers(json_path, state) == {}
+
+    json_path.write_text("{}")
+    assert fetch.build_headers(json_path, state) == {
+        "if-none-match": '"abc"',
+        "if-modified-since": "Mon, 06 Mar 2023 00:00:00 GMT",
+    }
+    assert fetch.build_headers(json_path, RepodataState()) == {}
+    assert fetch.build_headers(json_path, state, conditional=False) == {}
+
+
+def _mock_session(responses: dict):
+    """
+    Session whose get() answers by URL suffix from (status, content) pairs.
+    """
+
+    def get(url, **kwargs):
+        status, content = next(v for k, v in responses.items() if url.endswith(k))
+        response = requests.Response()
+        response.url = url
+        response.status_code = status
+        response.reason = "test"
+        response.request = requests.PreparedRequest()
+        response._content = content
+        response._content_consumed = True
+        return response
+
+    return Mock(get=Mock(side_effect=get))
+
+
+def _sent_headers(session, suffix):
+    return [
+        call.kwargs["headers"]
+        for call in session.get.call_args_list
+        if call.args[0].endswith(suffix)
+    ]
+
+
+def test_patch_not_found_unconditional(tmp_path: Path):
+    """
+    Re-downloading after a failed patch must not send validators: the stored
+    etag and mod may come from the .jlap response, and a 304 would keep the
+    unpatchable file.
+    """
+    json_path = tmp_path / "repodata.json"
+    json_path.write_text('{"info": {"broken": true}}')
+
+    jlap_path = tmp_path / "repodata.jlap"
+    make_test_jlap(b'{"info": {}}', changes=2).terminate().write(jlap_path)
+
+    state = RepodataState(dict={"_etag": '"jlap"', "_mod": "Mon, 06 Mar 2023 00:00:00 GMT"})
+    state[fetch.NOMINAL_HASH] = "0" * 64  # not in the patch chain
+    state.set_has_format("jlap", True)
+    state.set_has_format("zst", False)
+
+    session = _mock_session(
+        {".jlap": (200, jlap_path.read_bytes()), ".json": (200, b'{"info": {}}')}
+    )
+    fetch.request_url_jlap_state(
+        "https://repo.example.com/noarch/repodata.json",
+        state,
+        get_place=lambda url: json_path,
+        session=session,
+    )
+
+    assert _sent_headers(session, ".json") == [{}]
+    assert json_path.read_bytes() == b'{"info": {}}'
+
+
+def test_jlap_404_conditional(tmp_path: Path):
+    """
+    When .jlap is missing, the full download still sends the stored validators
+    so the server can answer 304 Not Modified.
+    """
+    json_path = tmp_path / "repodata.json"
+    json_path.write_text("{}")
+
+    state = RepodataState(dict={"_etag": '"zst-etag"'})
+    state[fetch.NOMINAL_HASH] = "0" * 64
+    state.set_has_format("jlap", True)
+    state.set_has_format("zst", True)
+
+    session = _mock_session({".jlap": (404, b""), ".json.zst": (304, b"")})
+    fetch.request_url_jlap_state(
+        "https://repo.example.com/noarch/repodata.json",
+        state,
+        get_place=lambda url: json_path,
+        session=session,
+    )
+
+    assert _sent_headers(session, ".json.zst") == [{"if-none-match": '"zst-etag"'}]
+    assert json_path.read_text() == "{}"
+
+
+def test_json_dumps_fallback():
+    """
+    The stdlib fallback writes the same bytes as orjson, so the patched
+    repodata.json and its actual_hash don't depend on orjson being installed.
+    """
+    orjson = pytest.importorskip("orjson")
+    data = {"info": {"subdir": "noarch"}, "packages": {"a": {"license": "é", "size": 1}}}
+    assert fetch._json_dumps(data) == orjson.dumps(data)
@@ -66,6 +66,19 @@ def test_save(tmp_path):
     assert state3 == state2
 
 
+def test_save_bytes(tmp_path):
+    """
+    bytes and non-ASCII str are both stored and loaded as UTF-8, whatever the
+    locale encoding, and state["size"] is the on-disk byte count.
+    """
+    cache = RepodataCache(tmp_path / "lockme", "repodata.json")
+    for data in ('{"info": "\u00e9"}', '{"info": "\u00e9"}'.encode()):
+        cache.save(data)
+        assert cache.cache_path_json.read_bytes() == '{"info": "\u00e9"}'.encode("utf-8")
+        assert cache.load() == '{"info": "\u00e9"}'
+        assert cache.state["size"] == cache.cache_path_json.stat().st_size == 14
+
+
 def test_stale(tmp_path):
     """
     RepodataCache should understand cache-control and modified time versus now.
@@ -474,6 +474,27 @@ class MatchSpecTests(TestCase):
         assert MatchSpec("*[license='*gpl*']").match(record)
         assert MatchSpec("*[license='*v3+']").match(record)
 
+    def test_compile_predicate(self):
+        records = (
+            DPkg("numpy-1.7.1-py27_0.tar.bz2"),
+            DPkg("numpy-1.0.1a.vc11-0.tar.bz2"),
+            DPkg("blas-1.0-openblas_0.tar.bz2"),
+        )
+        for spec in (
+            "numpy",
+            "numpy 1.7*",
+            "numpy >=1.0.1*.vc11",
+            "numpy 1.7.1 py26_0",
+            "blas * openblas_0",
+            "*[build_number=0]",
+            "*[version=1.*]",
+            "python",
+        ):
+            ms = MatchSpec(spec)
+            predicate = ms.compile_predicate()
+            for rec in records:
+                assert predicate(rec) == ms.match(rec)
+
 
 class TestArg2Spec(TestCase):
 